@@ -1,69 +1,117 @@
-from flask import Flask, request, jsonify
-import google.generativeai as genai
-import requests
+from flask import Flask, request
+from flask.json.provider import DefaultJSONProvider
+import httpx
 import os
-from dotenv import load_dotenv
+import json
+import hashlib
+import orjson
 from flask_cors import CORS
 import re
-import signal
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.middleware.proxy_fix import ProxyFix
+from common import (
+    GEMINI_API_KEY, GEMINI_MODEL, GENERAL_PROMPT, NUTRITION_PROMPT, NUTR_RE,
+    WEB_THREADS, cache_get, cache_set, gemini_key,
+)
+
+# ================================================================
+# LOGGING (handled on a background thread – never blocks a request)
+# ================================================================
+_log_queue = queue.Queue(-1)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# Root stays at WARNING – httpx logs full request URLs (incl. app_key) at INFO
+logging.getLogger().addHandler(logging.handlers.QueueHandler(_log_queue))
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
 # ================================================================
 # LOAD CONFIG
 # ================================================================
-load_dotenv()
+class ORJSONProvider(DefaultJSONProvider):
+    # orjson behind request.get_json() / jsonify for the whole app
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.wsgi_app = ProxyFix(app.wsgi_app)   # Prevent Render timeouts
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 EDAMAM_APP_ID = os.getenv("EDAMAM_APP_ID")
 EDAMAM_APP_KEY = os.getenv("EDAMAM_APP_KEY")
 
 if not GEMINI_API_KEY:
     raise ValueError("❌ Missing GEMINI_API_KEY")
 
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel("gemini-2.0-flash")
+GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}"
+GEMINI_TIMEOUT = 15   # seconds – prevents 3–4 min wait
 
-# ================================================================
-# TIMEOUT HANDLER (prevents 3–4 min wait)
-# ================================================================
-class TimeoutException(Exception):
-    pass
+# One pooled HTTP/2 client for Edamam and Gemini – concurrent requests
+# share a TLS session per host instead of each holding a keep-alive socket.
+# httpx drops idle connections after 5s by default, shorter than a typical
+# pause between chat messages, so keep them for 5 min instead.
+HTTP_KEEPALIVE = 300   # seconds
 
-def timeout_handler(signum, frame):
-    raise TimeoutException("Gemini timeout")
+HTTP = httpx.Client(
+    timeout=5,
+    transport=httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=HTTP_KEEPALIVE),
+        retries=2,
+    ),
+)
 
-signal.signal(signal.SIGALRM, timeout_handler)
+# ================================================================
+# BACKGROUND POOL – runs the Gemini fallback alongside an Edamam call
+# ================================================================
+# A fallback Gemini call can't be stopped once started and may outlive its
+# request by up to GEMINI_TIMEOUT, so leave room for one orphan per thread
+IO_POOL = ThreadPoolExecutor(max_workers=2 * WEB_THREADS)
 
 # ================================================================
 # HELPER – CLEAN BOT RESPONSE
 # ================================================================
+_BOLD = re.compile(r'\*{1,2}(.*?)\*{1,2}')
+_NL = re.compile(r'\n+')
+_WS = re.compile(r'\s{2,}')
+
 def clean_response(text):
     if not text:
         return "Sorry, I couldn't find information."
 
     text = text.strip()
-    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
-    text = re.sub(r'\*(.*?)\*', r'\1', text)
-    text = text.replace("**", "").replace("*", "")
-    text = re.sub(r'\n+', ' ', text).strip()
-
-    if len(text) > 250:
-        text = text[:250]
-        for p in ['.', '!', '?']:
-            if p in text[-20:]:
-                text = text[:text.rfind(p)+1]
-                break
+    text = _BOLD.sub(r'\1', text)
+    text = text.replace("*", "")    # unpaired markers
+    text = _NL.sub(' ', text)
+    text = _WS.sub(' ', text).strip()
 
-    return text
+    if len(text) <= 250:
+        return text
+
+    # Trim to the last sentence end in the final 20 chars, if any
+    tail = text[230:250]
+    cut = max(tail.rfind('.'), tail.rfind('!'), tail.rfind('?'))
+    if cut >= 0:
+        return text[:230 + cut + 1]
+    return text[:250]
 
 # ================================================================
 # EDAMAM NUTRITION API
 # ================================================================
-def get_food_data(query):
+def fetch_food_data(query):
     url = "https://api.edamam.com/api/nutrition-data"
     params = {
         "app_id": EDAMAM_APP_ID,
@@ -72,70 +120,150 @@ def get_food_data(query):
     }
 
     try:
-        res = requests.get(url, params=params, timeout=5)
+        res = HTTP.get(url, params=params)
         if res.status_code == 200:
             return res.json()
         return None
     except:
         return None
 
+def food_key(query):
+    return "edamam:" + hashlib.sha1(query.lower().strip().encode()).hexdigest()
+
+def cached_food_data(key):
+    # (hit, data) – data is None on a remembered miss
+    cached = cache_get(key)
+    if cached is None:
+        return False, None
+    if cached == "MISS":
+        return True, None
+    return True, json.loads(cached)
+
+def fetch_and_cache_food_data(query, key):
+    # Nutrition facts are effectively static → cache for 24h
+    data = fetch_food_data(query)
+    if data is None:
+        return None
+
+    if "totalNutrients" not in data:
+        # Unparseable query – remember briefly so repeats go straight to Gemini
+        cache_set(key, 600, "MISS")
+        return None
+
+    cache_set(key, 86400, json.dumps(data))
+    return data
+
+# ================================================================
+# GEMINI (cached for 1h on the normalized prompt)
+# ================================================================
+def gemini_answer(prompt):
+    key = gemini_key(prompt)
+
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+
+    res = HTTP.post(
+        f"{GEMINI_URL}:generateContent",
+        content=orjson.dumps({"contents": [{"parts": [{"text": prompt}]}]}),
+        headers={"Content-Type": "application/json", "x-goog-api-key": GEMINI_API_KEY},
+        timeout=GEMINI_TIMEOUT,
+    )
+    res.raise_for_status()
+    parts = orjson.loads(res.content)["candidates"][0]["content"]["parts"]
+    text = "".join(p.get("text", "") for p in parts)
+    if text:
+        cache_set(key, 3600, text)
+    return text
+
+# ================================================================
+# WARMUP – open the Edamam/Gemini connections before the first user
+# ================================================================
+# The sockets stay pooled for HTTP_KEEPALIVE, so a first request within
+# 5 min of boot skips the handshake (httpx's 5s default would drop them).
+def warm_connections():
+    try:
+        HTTP.get("https://api.edamam.com/", timeout=3)
+    except httpx.HTTPError as e:
+        logger.info("Edamam warmup failed: %s", e)
+    try:
+        # Model metadata lookup – same host as generateContent, not billed
+        HTTP.get(GEMINI_URL, headers={"x-goog-api-key": GEMINI_API_KEY}, timeout=3)
+    except httpx.HTTPError as e:
+        logger.info("Gemini warmup failed: %s", e)
+
+threading.Thread(target=warm_connections, daemon=True).start()
+
+# ================================================================
+# JSON RESPONSES (orjson bytes straight into the response body)
+# ================================================================
+def J(obj, status=200):
+    return app.response_class(orjson.dumps(obj), status=status, mimetype="application/json")
+
 # ================================================================
 # HEALTH CHECK – keeps server awake
 # ================================================================
 @app.route("/", methods=["GET"])
 def home():
-    return jsonify({"status": "running"}), 200
+    return J({"status": "running"})
 
 # ================================================================
 # CHAT ENDPOINT
 # ================================================================
+_NUTR_FMT = "🍛 {cal:.0f} kcal | Protein: {p:.1f} g | Fat: {f:.1f} g | Carbs: {c:.1f} g"
+
 @app.route("/chat", methods=["POST"])
 def chat():
-    data = request.json
-    user_input = data.get("message", "")
+    data = request.get_json(force=True, silent=True)
+    user_input = data.get("message", "") if isinstance(data, dict) else ""
 
     if not user_input:
-        return jsonify({"reply": "Please ask something."}), 400
+        return J({"reply": "Please ask something."}, 400)
 
     try:
-        # Max 15 seconds wait for Gemini
-        signal.alarm(15)
-
         # If user is asking about calories or nutrition
-        if any(word in user_input.lower() for word in
-               ["calorie", "nutrition", "protein", "fat", "carbs", "vitamin"]):
+        if NUTR_RE.search(user_input):
+
+            prompt = NUTRITION_PROMPT.format(user_input)
+            key = food_key(user_input)
+            hit, food_data = cached_food_data(key)
 
-            food_data = get_food_data(user_input)
+            gemini_future = None
+            if not hit:
+                # Edamam needs a round-trip – start the Gemini fallback
+                # alongside it so a miss costs max(T_edamam, T_gemini)
+                gemini_future = IO_POOL.submit(gemini_answer, prompt)
+                food_data = fetch_and_cache_food_data(user_input, key)
 
             if food_data and "totalNutrients" in food_data:
-                reply = (
-                    f"🍛 {food_data.get('calories', 0):.0f} kcal | "
-                    f"Protein: {food_data['totalNutrients'].get('PROCNT', {}).get('quantity', 0):.1f} g | "
-                    f"Fat: {food_data['totalNutrients'].get('FAT', {}).get('quantity', 0):.1f} g | "
-                    f"Carbs: {food_data['totalNutrients'].get('CHOCDF', {}).get('quantity', 0):.1f} g"
+                if gemini_future:
+                    gemini_future.cancel()   # no-op if it already started
+                tn = food_data.get("totalNutrients") or {}
+
+                def q(k):
+                    return tn.get(k, {}).get("quantity", 0)
+
+                reply = _NUTR_FMT.format(
+                    cal=food_data.get("calories", 0),
+                    p=q("PROCNT"), f=q("FAT"), c=q("CHOCDF")
                 )
+            elif gemini_future:
+                reply = gemini_future.result()
             else:
-                reply = model.generate_content(
-                    f"Respond in max 3 short lines: {user_input}"
-                ).text
+                reply = gemini_answer(prompt)
 
         else:
             # AI general conversation
-            reply = model.generate_content(
-                f"Respond shortly (max 3 lines): {user_input}"
-            ).text
+            reply = gemini_answer(GENERAL_PROMPT.format(user_input))
 
-    except TimeoutException:
-        return jsonify({"reply": "⚠️ AI took too long. Try again."}), 200
+    except httpx.TimeoutException:
+        return J({"reply": "⚠️ AI took too long. Try again."})
 
     except Exception as e:
-        print("⚠ Backend Error:", e)
-        return jsonify({"reply": "⚠ Something went wrong. Try again."}), 500
-
-    finally:
-        signal.alarm(0)
+        logger.exception("Backend error: %s", e)
+        return J({"reply": "⚠ Something went wrong. Try again."}, 500)
 
-    return jsonify({"reply": clean_response(reply)}), 200
+    return J({"reply": clean_response(reply)})
 
 # ================================================================
 # RUN LOCAL
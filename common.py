@@ -0,0 +1,66 @@
+import os
+import re
+import logging
+from hashlib import blake2b
+
+import redis
+from dotenv import load_dotenv
+
+# Shared by app.py and warm_cache.py – keep this module free of
+# import-time side effects (no threads, no network, no Flask app).
+logger = logging.getLogger(__name__)
+
+# ================================================================
+# LOAD CONFIG
+# ================================================================
+load_dotenv()
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+REDIS_URL = os.getenv("REDIS_URL")
+WEB_THREADS = int(os.getenv("WEB_THREADS", "16"))   # gunicorn threads per worker
+
+# ================================================================
+# REDIS CACHE (optional – app works without it)
+# ================================================================
+R = redis.Redis.from_url(
+    REDIS_URL, decode_responses=True,
+    socket_timeout=0.5, socket_connect_timeout=0.5
+) if REDIS_URL else None
+
+def cache_get(key):
+    if R is None:
+        return None
+    try:
+        return R.get(key)
+    except redis.exceptions.RedisError as e:
+        logger.warning("Redis GET failed: %s", e)
+        return None
+
+def cache_set(key, ttl, value):
+    if R is None:
+        return
+    try:
+        R.setex(key, ttl, value)
+    except redis.exceptions.RedisError as e:
+        logger.warning("Redis SETEX failed: %s", e)
+
+# ================================================================
+# GEMINI PROMPTS + CACHE KEYS
+# ================================================================
+GENERAL_PROMPT = "Respond shortly (max 3 lines): {}"
+NUTRITION_PROMPT = "Respond in max 3 short lines: {}"
+
+NUTR_RE = re.compile(
+    r'\b(calorie|nutrition|fat|protein|carb|ingredient|vitamin|food)', re.I
+)
+
+def gemini_prompt(user_input):
+    # Prompt chat() sends to Gemini for this message (used by warm_cache.py)
+    template = NUTRITION_PROMPT if NUTR_RE.search(user_input) else GENERAL_PROMPT
+    return template.format(user_input)
+
+def gemini_key(prompt):
+    # Model is part of the key so switching GEMINI_MODEL never serves old replies
+    normalized = GEMINI_MODEL + "\n" + " ".join(prompt.lower().split())
+    return "gem:" + blake2b(normalized.encode(), digest_size=16).hexdigest()
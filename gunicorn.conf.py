@@ -0,0 +1,8 @@
+from common import WEB_THREADS
+
+# Threaded workers – each thread waits on one Edamam/Gemini call.
+# WEB_THREADS also sizes IO_POOL in app.py, so the two stay in step.
+worker_class = "gthread"
+workers = 2
+threads = WEB_THREADS
+timeout = 30
@@ -0,0 +1,132 @@
+"""
+Warm the Redis "gem:" cache from a list of frequent user messages using
+the Gemini Batch API (half the price of online calls, no user waiting).
+
+    python warm_cache.py prompts.txt [--ttl 86400] [--poll 30]
+
+prompts.txt holds one user message per line, exactly as typed in /chat.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from google import genai
+from google.genai import types
+
+from common import (
+    GEMINI_API_KEY, GEMINI_MODEL, R,
+    cache_get, cache_set, gemini_key, gemini_prompt,
+)
+
+DONE_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED",
+}
+
+# ================================================================
+# BUILD BATCH INPUT
+# ================================================================
+def read_messages(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def build_requests(messages):
+    # Batch key == Redis key, so results map straight back into the cache
+    batch = {}
+    for message in messages:
+        prompt = gemini_prompt(message)
+        key = gemini_key(prompt)
+        if key in batch or cache_get(key) is not None:
+            continue
+        batch[key] = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    return batch
+
+def write_jsonl(batch):
+    fd, path = tempfile.mkstemp(suffix=".jsonl")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for key, req in batch.items():
+            f.write(json.dumps({"key": key, "request": req}) + "\n")
+    return path
+
+# ================================================================
+# RUN BATCH JOB
+# ================================================================
+def run_batch(client, path, poll):
+    uploaded = client.files.upload(
+        file=path,
+        config=types.UploadFileConfig(display_name="warm-cache", mime_type="jsonl"),
+    )
+    job = client.batches.create(
+        model=GEMINI_MODEL,
+        src=uploaded.name,
+        config={"display_name": "warm-cache"},
+    )
+    print(f"⏳ Batch job {job.name} created")
+
+    while job.state.name not in DONE_STATES:
+        time.sleep(poll)
+        job = client.batches.get(name=job.name)
+        print(f"   {job.state.name}")
+
+    return job
+
+def store_results(client, job, ttl):
+    content = client.files.download(file=job.dest.file_name).decode("utf-8")
+    stored = failed = 0
+
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        try:
+            parts = item["response"]["candidates"][0]["content"]["parts"]
+            text = "".join(p.get("text", "") for p in parts)
+        except (KeyError, IndexError):
+            failed += 1
+            continue
+        if not text:
+            failed += 1
+            continue
+        cache_set(item["key"], ttl, text)
+        stored += 1
+
+    return stored, failed
+
+# ================================================================
+# MAIN
+# ================================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("prompts", help="file with one user message per line")
+    parser.add_argument("--ttl", type=int, default=86400, help="cache TTL in seconds")
+    parser.add_argument("--poll", type=int, default=30, help="poll interval in seconds")
+    args = parser.parse_args()
+
+    if R is None:
+        sys.exit("❌ Missing REDIS_URL – nothing to warm")
+
+    batch = build_requests(read_messages(args.prompts))
+    if not batch:
+        print("✅ Everything already cached")
+        return
+
+    path = write_jsonl(batch)
+    try:
+        client = genai.Client(api_key=GEMINI_API_KEY)
+        job = run_batch(client, path, args.poll)
+    finally:
+        os.remove(path)
+
+    if job.state.name != "JOB_STATE_SUCCEEDED":
+        sys.exit(f"❌ Batch job ended in {job.state.name}")
+
+    stored, failed = store_results(client, job, args.ttl)
+    print(f"✅ Cached {stored} replies ({failed} failed)")
+
+if __name__ == "__main__":
+    main()